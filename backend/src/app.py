@@ -1,8 +1,12 @@
+import atexit
+import os
+from functools import lru_cache
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from webscrape import WebScraper
 from database import DatabaseManager
-from psycopg2 import connect, OperationalError
+from jobs import JobQueue
+from psycopg2.pool import ThreadedConnectionPool
 
 app = Flask(__name__)
 app.secret_key = ''
@@ -14,10 +18,39 @@ GOOGLE_CLIENT_SECRET = 'your_client_secret_here'
 GOOGLE_REDIRECT_URI = 'http://localhost:5000/oauth2callback'
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
-
+# Request threads per worker (gunicorn.conf.py reads the same variable) and background job
+# threads, which bound how many registrar pages each worker scrapes at once
+REQUEST_THREADS = int(os.environ.get("WEB_THREADS", 8))
+JOB_WORKERS = 5
+
+# Shared pool so requests borrow an open connection instead of reconnecting. Each thread
+# holds at most one connection at a time, and getconn raises PoolError rather than
+# waiting, so there is one connection per request or job thread. psycopg2 closes any
+# connection handed back while minconn are already idle, so minconn matches maxconn to
+# keep every connection (and the statements PREPAREd on it) open.
+POOL_SIZE = REQUEST_THREADS + JOB_WORKERS
+pool = ThreadedConnectionPool(
+    minconn=POOL_SIZE,
+    maxconn=POOL_SIZE,
+    dbname="cu_prelim_planner",
+    user="",
+    password="",
+    host="localhost",
+    port="5432"
+)
+# The pool is shared by every DatabaseManager and the job queue, so only the app closes it
+atexit.register(pool.closeall)
+
+# Upper bound on schedules accepted by one /courses/exams/create_batch request
+MAX_BATCH_SCHEDULES = 8
+
+
+@lru_cache(maxsize=16)
 def get_db_manager(semester, exam_type, table_name=None):
     """
     Returns a DatabaseManager instance configured with given semester and exam_type.
+    Instances are reused across request threads, so only use them for operations that
+    don't scrape; populate_job builds its own manager since the scraper keeps per-scrape state.
 
     :param semester: String
     :param exam_type: String
@@ -25,38 +58,95 @@ def get_db_manager(semester, exam_type, table_name=None):
     :return: DatabaseManager instance
     """
     scraper = WebScraper(semester, exam_type)
-    db_manager = DatabaseManager(lambda: connect(
-        dbname="cu_prelim_planner",
-        user="",
-        password="",
-        host="localhost",
-        port="5432"
-    ), scraper, table_name)
+    db_manager = DatabaseManager(pool, scraper, table_name)
     return db_manager
 
 
+def populate_job(semester, exam_type):
+    """
+    Scrapes and stores the exams for a semester and exam_type; run by job_queue.
+
+    :param semester: String
+    :param exam_type: String
+    :return: True if the table was populated successfully, False otherwise.
+    """
+    db_manager = DatabaseManager(pool, WebScraper(semester, exam_type))
+    return db_manager.populate_exam_table(semester, exam_type)
+
+
+# Background workers for /courses/exams/create so scraping never holds a request thread.
+# Jobs live in PostgreSQL, so any gunicorn worker can run a job or report its status.
+job_queue = JobQueue(pool, {'populate': populate_job}, max_workers=JOB_WORKERS)
+
+
 @app.route('/courses/exams/create', methods=['POST'])
 def create_all_exams():
     """
-    Initializes the database with exams based on provided semester and exam_type.
+    Queues a job that initializes the database with exams based on provided semester and exam_type.
 
     JSON Body Parameters:
     - semester: String
     - exam_type: String
 
     Returns:
-    - JSON response indicating success or failure.
+    - JSON object containing the job_id to poll at /jobs/<job_id>, with status 202.
     """
     try:
         data = request.json
         semester = data['semester']
         exam_type = data['exam_type']
-        db_manager = get_db_manager(semester, exam_type)
 
-        # Scrape the data and populate the database
-        db_manager.populate_exam_table(semester, exam_type)
+        # Scrape the data and populate the database in the background
+        job_id = job_queue.enqueue('populate', semester, exam_type)
+
+        return success_response({'job_id': job_id}, 202)
+    except Exception as e:
+        return failure_response(str(e))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Reports the status of a job queued by /courses/exams/create.
+
+    Path Parameters:
+    - job_id: String
+
+    Returns:
+    - JSON object containing the job_id and its status (queued, running, finished or failed).
+    """
+    try:
+        status = job_queue.status(job_id)
+        if status is None:
+            return failure_response(f"Job {job_id} not found.")
+        return success_response(status)
+    except Exception as e:
+        return failure_response(str(e))
+
+
+@app.route('/courses/exams/create_batch', methods=['POST'])
+def create_exams_batch():
+    """
+    Queues one job per semester and exam_type pair, like /courses/exams/create, in a single
+    transaction. Each gunicorn worker scrapes up to JOB_WORKERS of the registrar pages at once.
+
+    JSON Body Parameters:
+    - schedules: List of at most MAX_BATCH_SCHEDULES objects, each with
+        - semester: String
+        - exam_type: String
+
+    Returns:
+    - JSON object containing the job_ids to poll at /jobs/<job_id>, in request order, with status 202.
+    """
+    try:
+        schedules = request.json['schedules']
+        if len(schedules) > MAX_BATCH_SCHEDULES:
+            return failure_response(f"At most {MAX_BATCH_SCHEDULES} schedules can be created at once.", 400)
+        pairs = [(schedule['semester'], schedule['exam_type']) for schedule in schedules]
+
+        job_ids = job_queue.enqueue_many('populate', pairs)
 
-        return success_response("Exam data created successfully.")
+        return success_response({'job_ids': job_ids}, 202)
     except Exception as e:
         return failure_response(str(e))
 
@@ -197,6 +287,6 @@ def failure_response(message, code=404):
     return jsonify({'error': message}), code
 
 
-# Main entry point to run the Flask application
+# Main entry point to run the Flask development server; use gunicorn.conf.py in production
 if __name__ == '__main__':
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
@@ -1,41 +1,207 @@
-from psycopg2 import connect, OperationalError
-from typing import Callable, Dict, Any, Union, List, Set
+import csv
+import io
+import re
+import threading
+import weakref
+from contextlib import contextmanager
+from cachetools import TTLCache
+from psycopg2 import Error
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import AbstractConnectionPool
+from typing import Dict, Any, Union, List, Iterator, Set, Tuple
 from webscrape import WebScraper
 
+# SQL keyed by (operation, exam_type); {table_name} is filled in once per table by _render_query
+QUERY_TEMPLATES: Dict[Tuple[str, str], str] = {
+    ('create', 'prelim'): """
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                course_code TEXT NOT NULL,
+                exam_date TEXT NOT NULL,
+                exam_locations TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {table_name}_course_code_idx ON {table_name} (course_code);
+            """,
+    ('create', 'final'): """
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                course_code TEXT NOT NULL,
+                exam_date TEXT NOT NULL,
+                exam_time TEXT NOT NULL,
+                exam_or_deliverable TEXT NOT NULL,
+                exam_locations TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {table_name}_course_code_idx ON {table_name} (course_code);
+            """,
+    ('insert', 'prelim'): """
+            INSERT INTO {table_name} (course_code, exam_date, exam_locations)
+            VALUES (%s, %s, %s);
+            """,
+    ('insert', 'final'): """
+            INSERT INTO {table_name} (course_code, exam_date, exam_time, exam_or_deliverable, exam_locations)
+            VALUES (%s, %s, %s, %s, %s);
+            """,
+    ('copy', 'prelim'): """
+            COPY {table_name} (course_code, exam_date, exam_locations)
+            FROM STDIN WITH (FORMAT csv);
+            """,
+    ('copy', 'final'): """
+            COPY {table_name} (course_code, exam_date, exam_time, exam_or_deliverable, exam_locations)
+            FROM STDIN WITH (FORMAT csv);
+            """,
+    ('update', 'prelim'): """
+            UPDATE {table_name}
+            SET exam_date = %s, exam_locations = %s
+            WHERE course_code = %s;
+            """,
+    ('update', 'final'): """
+            UPDATE {table_name}
+            SET exam_date = %s, exam_time = %s, exam_or_deliverable = %s, exam_locations = %s
+            WHERE course_code = %s;
+            """,
+}
+
 
 class DatabaseManager:
     """
     A class to manage interactions with a PostgreSQL database for storing and retrieving exam data.
 
     Attributes:
-        conn (Callable): The function to get a database connection.
+        pool (AbstractConnectionPool): The pool database connections are borrowed from.
         table_name (str): Current table name being operated on.
+        _statement_names (Dict): Prepared statement names keyed by (table_name, op, exam_type).
+        _prepared_on (Dict): The prepared statement names already PREPAREd on each pooled connection.
+        _sql_cache (Dict): Rendered QUERY_TEMPLATES keyed by (table_name, op, exam_type).
     """
 
-    def __init__(self, db_connect: Callable[[], Any], scraper: WebScraper, table_name=None):
+    _statement_names: Dict[Tuple[str, str, str], str] = {}
+    _statement_lock = threading.Lock()
+    _sql_cache: Dict[Tuple[str, str, str], str] = {}
+    # Weakly keyed so connections the pool closes and discards drop out on their own
+    _prepared_on: "weakref.WeakKeyDictionary[Any, Set[str]]" = weakref.WeakKeyDictionary()
+
+    # Reads are cached per process and dropped whenever this process writes to the table.
+    # Other gunicorn workers only notice a write once their entry expires, so the TTL is
+    # the longest a worker can serve stale exams after another worker's write.
+    _courses_cache: TTLCache = TTLCache(maxsize=32, ttl=60)
+    _exam_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+    _cache_generations: Dict[str, int] = {}  # Bumped per table on invalidation
+    _cache_lock = threading.Lock()
+
+    def __init__(self, pool: AbstractConnectionPool, scraper: WebScraper, table_name=None):
         """
-        Initializes the DatabaseManager with the specified database connection details.
+        Initializes the DatabaseManager with the specified connection pool.
 
         Args:
-            db_connect (Callable): The function to get a database connection.
+            pool (AbstractConnectionPool): The pool database connections are borrowed from.
             scraper (WebScraper): An instance of the WebScraper class.
         """
-        self.conn = db_connect()
+        self.pool = pool
         self.scraper = scraper
         self.table_name = table_name
 
-    def close_connection(self) -> bool:
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """
+        Borrows a connection from the pool and returns it once the block exits.
+
+        Yields:
+            connection: A psycopg2 connection owned by the pool.
+        """
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+
+    def _execute_prepared(self, cur, op: str, exam_type: str, query: str, params: tuple) -> None:
+        """
+        Executes a query through a server-side prepared statement, preparing it on the
+        cursor's connection the first time that connection sees it.
+
+        Args:
+            cur (cursor): The cursor to execute on.
+            op (str): The operation the query performs (e.g., insert or fetch).
+            exam_type (str): The type of exam (e.g., prelim or final).
+            query (str): The SQL query using %s placeholders.
+            params (tuple): The values to bind to the placeholders.
+        """
+        key = (self.table_name, op, exam_type.lower())
+        with self._statement_lock:
+            name = self._statement_names.get(key)
+            if name is None:
+                # Numbered rather than derived from the table name, which could collide once
+                # case-folded or truncated to PostgreSQL's 63 character limit
+                name = self._statement_names[key] = f"{op}_{len(self._statement_names)}"
+
+        prepared = self._prepared_on.setdefault(cur.connection, set())
+        if name not in prepared:
+            placeholders = iter(range(1, len(params) + 1))
+            body = re.sub(r'%s', lambda _: f"${next(placeholders)}", query.strip().rstrip(';'))
+            cur.execute(f"PREPARE {name} AS {body};")
+            prepared.add(name)
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
+
+    def _render_query(self, op: str, table_name: str, exam_type: str) -> str:
         """
-        Closes the database connection if it is open.
+        Renders a query from QUERY_TEMPLATES for a table, formatting each one only once.
+
+        Args:
+            op (str): The operation (create, insert, copy or update).
+            table_name (str): The name of the table.
+            exam_type (str): The type of exam (e.g., prelim or final).
 
         Returns:
-            bool: True if the connection is closed successfully, False otherwise.
+            str: The SQL query for the table.
         """
-        if self.conn:
-            self.conn.close()
-            return self.success_response("Database connection closed.")
-        else:
-            return self.error_response("No active database connection to close.")
+        key = (table_name, op, exam_type.lower())
+        query = self._sql_cache.get(key)
+        if query is None:
+            template = QUERY_TEMPLATES.get((op, exam_type.lower()))
+            if template is None:
+                raise ValueError("Unknown exam type")
+            query = self._sql_cache[key] = template.format(table_name=table_name)
+        return query
+
+    def _cache_lookup(self, cache: TTLCache, key: Any) -> Tuple[Any, int]:
+        """
+        Looks up a cached read for the current table.
+
+        Returns:
+            Tuple: The cached value (or None on a miss) and the table's cache generation,
+            which must be passed to _cache_store along with the value read from the database.
+        """
+        with self._cache_lock:
+            return cache.get(key), self._cache_generations.get(self.table_name, 0)
+
+    def _cache_store(self, cache: TTLCache, key: Any, value: Any, generation: int) -> None:
+        """
+        Caches a read for the current table unless the table was invalidated since the
+        read started, so rows fetched before a write can't outlive the write's invalidation.
+
+        Args:
+            cache (TTLCache): The cache to store into.
+            key (Any): The cache key.
+            value (Any): The value read from the database.
+            generation (int): The generation returned by _cache_lookup before the read.
+        """
+        with self._cache_lock:
+            if self._cache_generations.get(self.table_name, 0) == generation:
+                cache[key] = value
+
+    def _invalidate_cache(self, course_code: str = None, table_name: str = None) -> None:
+        """
+        Drops cached reads for a table.
+
+        Args:
+            course_code (str): Only drop cached exams for this course code (optional, default every course).
+            table_name (str): The table whose reads are dropped (optional, default the current table).
+        """
+        table_name = table_name or self.table_name
+        with self._cache_lock:
+            self._cache_generations[table_name] = self._cache_generations.get(table_name, 0) + 1
+            self._courses_cache.pop(table_name, None)
+            for key in list(self._exam_cache.keys()):
+                if key[0] == table_name and (course_code is None or key[1] == course_code):
+                    self._exam_cache.pop(key, None)
 
     def set_exam_table_name(self, table_name: str) -> None:
         """
@@ -57,27 +223,7 @@ class DatabaseManager:
         Returns:
             str: The SQL query to create the table.
         """
-        if exam_type.lower() == 'prelim':
-            return f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                course_code TEXT NOT NULL,
-                exam_date TEXT NOT NULL,
-                exam_locations TEXT NOT NULL
-            );
-            """
-
-        elif exam_type.lower() == 'final':
-            return f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                course_code TEXT NOT NULL,
-                exam_date TEXT NOT NULL,
-                exam_time TEXT NOT NULL,
-                test_type TEXT NOT NULL 
-                exam_locations TEXT NOT NULL
-            );
-            """
-        else:
-            raise ValueError("Unknown exam type")
+        return self._render_query('create', table_name, exam_type)
 
     def create_exam_table(self, semester: str, exam_type: str, year: str) -> bool:
         """
@@ -93,16 +239,15 @@ class DatabaseManager:
         """
         self.set_exam_table_name(f"{semester}_{year}_{exam_type}_exams")
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn, conn.cursor() as cur:
                 cur.execute(self.generate_create_table_query(self.table_name, exam_type))
-                self.conn.commit()
             return self.success_response("Table created successfully!")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error creating table in PostgreSQL: {e}")
 
     def populate_exam_table(self, semester: str, exam_type: str) -> bool:
         """
-        Populates the exam table with data scraped from the web.
+        Populates the exam table with data scraped from the web, replacing any rows already in it.
 
         Args:
             semester (str): The semester for which the exam table is populated.
@@ -111,23 +256,28 @@ class DatabaseManager:
         Returns:
             bool: True if the table was populated successfully, False otherwise.
         """
-        self.scraper.scrape_course_info()
-        exams_data = self.scraper.process_exam_data(self.scraper.file_name)
-        self.create_exam_table(semester, exam_type.lower(), self.scraper.year)
+        if self.scraper.scrape_course_info() is False:
+            return self.error_response("Error scraping exam data; the exam table was left unchanged.")
+        exams_data = self.scraper.process_exam_data()
+        if exams_data is False:
+            return self.error_response("Error processing scraped exam data; the exam table was left unchanged.")
+        self.set_exam_table_name(f"{semester}_{self.scraper.year}_{exam_type.lower()}_exams")
+        # Scraped rows are already tuples in the table's column order
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(exams_data)  # Quoted so '' stays '' rather than NULL
+        buffer.seek(0)
         try:
-            for exam_info in exams_data:
-                code = exam_info.get('course_code')
-                date = exam_info.get('exam_date')
-                locations = exam_info.get('exam_locations')
-                if exam_type.lower() == 'final':
-                    time = exam_info.get('exam_time')
-                    test_type = exam_info.get('test_type')
-                    self.insert_exam(code, date, locations, exam_type.lower(), time, test_type)
-                else:
-                    self.insert_exam(code, date, locations, exam_type.lower())
-            self.conn.commit()
+            # One transaction for the table and its rows: committed on success, rolled back on error.
+            # The scrape replaces the table's rows, so a retried or duplicate job can't load them twice;
+            # the advisory lock queues concurrent populates of the same table behind each other.
+            with self._connection() as conn, conn, conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (self.table_name,))
+                cur.execute(self.generate_create_table_query(self.table_name, exam_type))
+                cur.execute(f"DELETE FROM {self.table_name};")
+                cur.copy_expert(self.generate_copy_exams_query(self.table_name, exam_type), buffer)
+            self._invalidate_cache()
             return self.success_response("Data inserted into database successfully!")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error inserting data into PostgreSQL: {e}")
 
     def delete_table(self, table_name: str) -> bool:
@@ -140,13 +290,13 @@ class DatabaseManager:
         Returns:
             bool: True if the table was deleted successfully, False otherwise.
         """
-        if self.conn:
+        if self.pool:
             try:
-                with self.conn.cursor() as cur:
+                with self._connection() as conn, conn, conn.cursor() as cur:
                     cur.execute(f"DROP TABLE IF EXISTS {table_name};")
-                    self.conn.commit()
+                self._invalidate_cache(table_name=table_name)
                 return self.success_response(f"Table '{table_name}' deleted successfully.")
-            except OperationalError as e:
+            except Error as e:
                 return self.error_response(f"Error deleting table: {e}")
         else:
             return self.error_response("Database connection not available.")
@@ -162,18 +312,20 @@ class DatabaseManager:
         Returns:
             str: The SQL query to insert data into the table.
         """
-        if exam_type.lower() == 'prelim':
-            return f"""
-            INSERT INTO {table_name} (course_code, exam_date, exam_locations)
-            VALUES (%s, %s, %s);
-            """
-        elif exam_type.lower() == 'final':
-            return f"""
-            INSERT INTO {table_name} (course_code, exam_date, exam_time, exam_or_deliverable, exam_locations)
-            VALUES (%s, %s, %s, %s, %s);
-            """
-        else:
-            raise ValueError("Unknown exam type")
+        return self._render_query('insert', table_name, exam_type)
+
+    def generate_copy_exams_query(self, table_name: str, exam_type: str) -> str:
+        """
+        Generates the SQL query to bulk load CSV exam rows into a table with COPY.
+
+        Args:
+            table_name (str): The name of the table.
+            exam_type (str): The type of exam (e.g., prelim or final).
+
+        Returns:
+            str: The COPY ... FROM STDIN query for the table.
+        """
+        return self._render_query('copy', table_name, exam_type)
 
     def insert_exam(self, code, date, locations, exam_type, time=None, test_type=None) -> bool:
         """
@@ -190,19 +342,21 @@ class DatabaseManager:
         Returns:
             bool: True if insertion is successful, False otherwise.
         """
-        insert_query = self.generate_insert_exam_query(self.table_name, exam_type.lower())
+        exam_type = exam_type.lower()
+        if exam_type == 'prelim':
+            params = (code, date, locations)
+        elif exam_type == 'final':
+            params = (code, date, time, test_type, locations)
+        else:
+            raise ValueError("Unknown exam type")
+        insert_query = self.generate_insert_exam_query(self.table_name, exam_type)
 
         try:
-            with self.conn.cursor() as cur:
-                if exam_type.lower() == 'prelim':
-                    cur.execute(insert_query, (code, date, locations))
-                elif exam_type.lower() == 'final':
-                    cur.execute(insert_query, (code, date, time, test_type, locations))
-                else:
-                    raise ValueError("Unknown exam type")
-                self.conn.commit()
+            with self._connection() as conn, conn, conn.cursor() as cur:
+                self._execute_prepared(cur, 'insert', exam_type, insert_query, params)
+            self._invalidate_cache(code)
             return self.success_response("Exam record inserted successfully.")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error inserting exam record: {e}")
 
     def generate_update_exam_query(self, table_name: str, exam_type: str) -> str:
@@ -216,34 +370,24 @@ class DatabaseManager:
         Returns:
             str: The SQL query to update data in the table.
         """
-        if exam_type.lower() == 'prelim':
-            return f"""
-            UPDATE {table_name}
-            SET exam_date = %s, exam_locations = %s
-            WHERE course_code = %s;
-            """
-        elif exam_type.lower() == 'final':
-            return f"""
-            UPDATE {table_name}
-            SET exam_date = %s, exam_time = %s, exam_or_deliverable = %s, exam_locations = %s
-            WHERE course_code = %s;
-            """
+        return self._render_query('update', table_name, exam_type)
+
+    def update_exam(self, code, date, locations, exam_type, time=None, test_type=None) -> bool:
+        exam_type = exam_type.lower()
+        if exam_type == 'prelim':
+            params = (date, locations, code)
+        elif exam_type == 'final':
+            params = (date, time, test_type, locations, code)
         else:
             raise ValueError("Unknown exam type")
+        update_query = self.generate_update_exam_query(self.table_name, exam_type)
 
-    def update_exam(self, code, date, locations, exam_type, time=None, test_type=None) -> bool:
         try:
-            with self.conn.cursor() as cur:
-                update_query = self.generate_update_exam_query(self.table_name, exam_type)
-                if exam_type.lower() == 'prelim':
-                    cur.execute(update_query, (code, date, locations))
-                elif exam_type.lower() == 'final':
-                    cur.execute(update_query, (code, date, time, test_type, locations))
-                else:
-                    raise ValueError("Unknown exam type")
-                self.conn.commit()
+            with self._connection() as conn, conn, conn.cursor() as cur:
+                self._execute_prepared(cur, 'update', exam_type, update_query, params)
+            self._invalidate_cache(code)
             return self.success_response("Exam record updated successfully.")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error updating exam record: {e}")
 
     def delete_exam(self, course_code: str) -> bool:
@@ -257,12 +401,12 @@ class DatabaseManager:
             bool: True if successful, False otherwise.
         """
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn, conn.cursor() as cur:
                 delete_query = f"""DELETE FROM "{self.table_name}"WHERE course_code = %s;"""
-                cur.execute(delete_query, (course_code,))
-                self.conn.commit()
+                self._execute_prepared(cur, 'delete', 'any', delete_query, (course_code,))
+            self._invalidate_cache(course_code)
             return self.success_response("Exam record deleted successfully.")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error deleting exam record: {e}")
 
     def fetch_exam(self, course_code: str, exam_type) -> Union[List[Dict[str, Any]], bool]:
@@ -272,13 +416,19 @@ class DatabaseManager:
         :param exam_type:
         :return:
         """
+        key = (self.table_name, course_code, exam_type)
+        cached_exams, generation = self._cache_lookup(self._exam_cache, key)
+        if cached_exams is not None:
+            return cached_exams
         try:
-            with self.conn.cursor() as cur:
-                fetch_query = f"""SELECT * FROM "{self.table_name}" WHERE course_code = %s;"""
-                cur.execute(fetch_query, (course_code,))
-                exam_records = cur.fetchall()
-            return [self.format_exam_record(record, exam_type) for record in exam_records]
-        except OperationalError as e:
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                columns = self.generate_select_exam_columns(exam_type)
+                fetch_query = f"""SELECT {columns} FROM "{self.table_name}" WHERE course_code = %s;"""
+                self._execute_prepared(cur, 'fetch', exam_type, fetch_query, (course_code,))
+                exams = cur.fetchall()
+            self._cache_store(self._exam_cache, key, exams, generation)
+            return exams
+        except Error as e:
             return self.error_response(f"Error fetching exam records: {e}")
 
     def fetch_k_exams(self, course_codes: List[str], exam_type: str) -> Union[
@@ -290,17 +440,16 @@ class DatabaseManager:
         :return:
         """
         try:
-            exam_records = []
-            with self.conn.cursor() as cur:
-                k = len(course_codes)
-                for i in range(k):
-                    fetch_query = f"""SELECT * FROM "{self.table_name}" WHERE course_code = %s;"""
-                    cur.execute(fetch_query, (course_codes[i],))
-                    record = cur.fetchone()
-                    if record:
-                        exam_records.append(self.format_exam_record(record, exam_type))
-            return exam_records
-        except OperationalError as e:
+            with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                columns = self.generate_select_exam_columns(exam_type)
+                fetch_query = f"""SELECT {columns} FROM "{self.table_name}" WHERE course_code = ANY(%s);"""
+                cur.execute(fetch_query, (list(course_codes),))
+                records_by_code = {}
+                for record in cur.fetchall():
+                    records_by_code.setdefault(record['course_code'], record)
+            # Keep the caller's ordering and the first record per course code
+            return [records_by_code[code] for code in course_codes if code in records_by_code]
+        except Error as e:
             return self.error_response(f"Error fetching exam records: {e}")
 
     def fetch_all_courses(self) -> Union[list[Any], bool]:
@@ -308,16 +457,27 @@ class DatabaseManager:
         Fetches all unique course codes from the exam table.
 
         Returns:
-            List[str]: A list of course codes.
+            List[str]: A sorted list of course codes.
         """
-
+        cached_codes, generation = self._cache_lookup(self._courses_cache, self.table_name)
+        if cached_codes is not None:
+            return cached_codes
         try:
-            with self.conn.cursor() as cur:
-                fetch_query = f"SELECT DISTINCT course_code FROM {self.table_name};"
+            # A named cursor streams rows from the server in chunks; the ORDER BY walks the
+            # course_code index so duplicates arrive adjacent and are dropped here
+            with self._connection() as conn, conn.cursor(name='courses_cur') as cur:
+                cur.itersize = 1000
+                fetch_query = f"SELECT course_code FROM {self.table_name} ORDER BY course_code;"
                 cur.execute(fetch_query)
-                course_codes = [record[0] for record in cur.fetchall()]
+                course_codes = []
+                previous = None
+                for (course_code,) in cur:
+                    if course_code != previous:
+                        course_codes.append(course_code)
+                        previous = course_code
+            self._cache_store(self._courses_cache, self.table_name, course_codes, generation)
             return course_codes
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error fetching course codes: {e}")
 
     def delete_all_exams(self) -> bool:
@@ -328,43 +488,30 @@ class DatabaseManager:
             bool: True if successful, False otherwise.
         """
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn, conn.cursor() as cur:
                 delete_all_query = f"""
                 DELETE FROM "{self.table_name}";
                 """
                 cur.execute(delete_all_query)
-                self.conn.commit()
+            self._invalidate_cache()
             return self.success_response("All exam records deleted successfully.")
-        except OperationalError as e:
+        except Error as e:
             return self.error_response(f"Error deleting all exam records: {e}")
 
-    def format_exam_record(self, record: tuple, exam_type: str) -> Dict[str, Any]:
+    def generate_select_exam_columns(self, exam_type: str) -> str:
         """
-        Formats a database record into a dictionary.
+        Generates the SELECT list for exam records, aliased to the keys the API returns.
 
         Args:
-            record (tuple): A tuple representing a database record.
+            exam_type (str): The type of exam (e.g., prelim or final).
 
         Returns:
-            Dict[str, Any]: A dictionary representing the record.
-            :param record:
-            :param exam_type:
-        """
-
-        if exam_type == "prelim":
-            return {
-                'course_code': record[0],
-                'exam_date': record[1],
-                'exam_locations': record[2]
-            }
-        elif exam_type == "final":
-            return {
-                'course_code': record[0],
-                'exam_date': record[1],
-                'exam_time': record[2],
-                'test_type': record[3],
-                'exam_locations': record[4]
-            }
+            str: The comma separated column list.
+        """
+        if exam_type.lower() == 'prelim':
+            return "course_code, exam_date, exam_locations"
+        elif exam_type.lower() == 'final':
+            return "course_code, exam_date, exam_time, exam_or_deliverable AS test_type, exam_locations"
         else:
             raise ValueError("Unknown exam type")
 
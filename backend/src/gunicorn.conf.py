@@ -0,0 +1,15 @@
+# Gunicorn settings for serving the Flask app: gunicorn -c gunicorn.conf.py app:app
+# Endpoints mostly wait on the registrar site or PostgreSQL, so threaded
+# workers let one process overlap many requests.
+#
+# Keep the worker count small and fixed: every worker opens its own connection
+# pool of WEB_THREADS + JOB_WORKERS connections (see app.py), so the total
+# workers * (WEB_THREADS + JOB_WORKERS) must stay well under PostgreSQL's
+# max_connections (100 by default). The read caches are also per process.
+import os
+
+bind = "127.0.0.1:5000"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_WORKERS", 2))
+threads = int(os.environ.get("WEB_THREADS", 8))
+timeout = 60
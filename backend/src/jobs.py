@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from psycopg2 import Error
+from psycopg2.pool import AbstractConnectionPool
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+# Every gunicorn worker runs this on import; the advisory lock makes them create the table one
+# at a time, since concurrent CREATE TABLE IF NOT EXISTS can fail with a unique violation
+CREATE_JOBS_TABLE_QUERY = """
+            SELECT pg_advisory_xact_lock(hashtext('jobs'));
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                task TEXT NOT NULL,
+                args TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, created_at);
+            """
+
+# Jobs left 'running' past the lease belonged to a worker that died; retry them or give up
+SWEEP_JOBS_QUERY = """
+            UPDATE jobs SET status = 'failed', error = 'Worker stopped before the job finished.', updated_at = now()
+            WHERE status = 'running' AND updated_at < now() - %s * interval '1 second' AND attempts >= %s;
+            DELETE FROM jobs WHERE status IN ('finished', 'failed') AND updated_at < now() - interval '1 day';
+            """
+
+CLAIM_JOB_QUERY = """
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = now()
+            WHERE job_id = (
+                SELECT job_id FROM jobs
+                WHERE status = 'queued'
+                    OR (status = 'running' AND updated_at < now() - %s * interval '1 second' AND attempts < %s)
+                ORDER BY created_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING job_id, task, args;
+            """
+
+
+class JobQueue:
+    """
+    A job queue backed by a PostgreSQL table, so slow work (scraping + populating tables)
+    runs off the request thread and every gunicorn worker sees the same job status.
+
+    Each process runs its own worker threads; they claim queued jobs with
+    FOR UPDATE SKIP LOCKED, so a job runs on exactly one of them. Jobs whose worker
+    died are picked up again once their lease expires.
+
+    Attributes:
+        pool (AbstractConnectionPool): The pool database connections are borrowed from.
+        tasks (Dict): The functions jobs may run, keyed by task name.
+        lease (int): Seconds a running job may go without finishing before it is retried.
+        max_attempts (int): How many times a job is started before it is marked failed.
+        poll_interval (float): Seconds an idle worker waits before checking for new jobs.
+        sweep_interval (float): Seconds between sweeps that fail abandoned jobs and delete old ones.
+    """
+
+    def __init__(self, pool: AbstractConnectionPool, tasks: Dict[str, Callable[..., Any]], max_workers: int = 2,
+                 lease: int = 300, max_attempts: int = 3, poll_interval: float = 2.0, sweep_interval: float = 60.0):
+        """
+        Initializes the JobQueue, creating the jobs table and starting the worker threads.
+
+        Args:
+            pool (AbstractConnectionPool): The pool database connections are borrowed from.
+            tasks (Dict): The functions jobs may run, keyed by task name; returning False marks a job failed.
+            max_workers (int): The number of jobs this process may run at once.
+            lease (int): Seconds a running job may go without finishing before it is retried.
+            max_attempts (int): How many times a job is started before it is marked failed.
+            poll_interval (float): Seconds an idle worker waits before checking for new jobs.
+            sweep_interval (float): Seconds between sweeps that fail abandoned jobs and delete old ones.
+        """
+        self.pool = pool
+        self.tasks = tasks
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._wakeup = threading.Event()
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+        with self._connection() as conn, conn, conn.cursor() as cur:
+            cur.execute(CREATE_JOBS_TABLE_QUERY)
+
+        for i in range(max_workers):
+            threading.Thread(target=self._work, name=f"job-{i}", daemon=True).start()
+
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """
+        Borrows a connection from the pool and returns it once the block exits.
+
+        Yields:
+            connection: A psycopg2 connection owned by the pool.
+        """
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+
+    def enqueue(self, task: str, *args: Any) -> str:
+        """
+        Stores a job to run in the background.
+
+        Args:
+            task (str): The name of one of the queue's tasks.
+            *args: JSON serializable positional arguments passed to the task.
+
+        Returns:
+            str: The id used to poll the job's status.
+        """
+        return self.enqueue_many(task, [args])[0]
+
+    def enqueue_many(self, task: str, args_list: List[Tuple[Any, ...]]) -> List[str]:
+        """
+        Stores several jobs for the same task in one transaction, so either all of them
+        are queued or none are.
+
+        Args:
+            task (str): The name of one of the queue's tasks.
+            args_list (List[Tuple]): The JSON serializable positional arguments of each job.
+
+        Returns:
+            List[str]: The ids used to poll the jobs' status, in the order of args_list.
+        """
+        if task not in self.tasks:
+            raise ValueError(f"Unknown task {task}")
+        job_ids = [uuid.uuid4().hex for _ in args_list]
+        with self._connection() as conn, conn, conn.cursor() as cur:
+            cur.executemany("INSERT INTO jobs (job_id, task, args, status) VALUES (%s, %s, %s, 'queued');",
+                            [(job_id, task, json.dumps(args)) for job_id, args in zip(job_ids, args_list)])
+        self._wakeup.set()
+        return job_ids
+
+    def status(self, job_id: str) -> Union[Dict[str, Any], None]:
+        """
+        Reports the state of a submitted job.
+
+        Args:
+            job_id (str): The id returned by enqueue.
+
+        Returns:
+            Dict[str, Any]: The job id and its status (queued, running, finished or failed),
+            plus an error message for failed jobs, or None if the job is unknown.
+        """
+        with self._connection() as conn, conn, conn.cursor() as cur:
+            cur.execute("SELECT status, error FROM jobs WHERE job_id = %s;", (job_id,))
+            record = cur.fetchone()
+        if record is None:
+            return None
+        status, error = record
+        if status == 'failed':
+            return {'job_id': job_id, 'status': status, 'error': error}
+        return {'job_id': job_id, 'status': status}
+
+    def _sweep_due(self) -> bool:
+        """
+        Reports whether this process should sweep the jobs table now, so idle workers
+        don't all run the sweep on every poll.
+
+        Returns:
+            bool: True at most once per sweep_interval.
+        """
+        with self._sweep_lock:
+            now = time.monotonic()
+            if now < self._next_sweep:
+                return False
+            self._next_sweep = now + self.sweep_interval
+            return True
+
+    def _claim(self) -> Union[Tuple[str, str, list], None]:
+        """
+        Claims the oldest queued (or abandoned) job for this worker.
+
+        Returns:
+            Tuple: The job id, task name and arguments, or None if there is nothing to run.
+        """
+        with self._connection() as conn, conn, conn.cursor() as cur:
+            if self._sweep_due():
+                cur.execute(SWEEP_JOBS_QUERY, (self.lease, self.max_attempts))
+            cur.execute(CLAIM_JOB_QUERY, (self.lease, self.max_attempts))
+            record = cur.fetchone()
+        if record is None:
+            return None
+        job_id, task, args = record
+        return job_id, task, json.loads(args)
+
+    def _finish(self, job_id: str, status: str, error: str = None) -> None:
+        """
+        Records the outcome of a job.
+
+        Args:
+            job_id (str): The id of the job.
+            status (str): Either finished or failed.
+            error (str): Why the job failed (optional, default None).
+        """
+        with self._connection() as conn, conn, conn.cursor() as cur:
+            cur.execute("UPDATE jobs SET status = %s, error = %s, updated_at = now() WHERE job_id = %s;",
+                        (status, error, job_id))
+
+    def _work(self) -> None:
+        """
+        Worker thread loop: claims jobs, runs them and records their outcome.
+        """
+        while True:
+            try:
+                job = self._claim()
+            except Error as e:
+                print(f"Error: Error claiming job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, task, args = job
+            try:
+                if self.tasks[task](*args) is False:  # DatabaseManager methods report failure by returning False
+                    status, error = 'failed', "Job did not complete successfully."
+                else:
+                    status, error = 'finished', None
+            except Exception as e:
+                status, error = 'failed', str(e)
+            try:
+                self._finish(job_id, status, error)
+            except Error as e:
+                print(f"Error: Error recording job {job_id}: {e}")
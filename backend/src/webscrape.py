@@ -1,37 +1,75 @@
-from typing import List, Dict, Union
+from typing import List, Tuple, Union
+import json
+import os
+import stat
+import tempfile
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
+# Shared by every scraper so repeat scrapes reuse keep-alive connections to the registrar
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
 
 class WebScraper:
+    # Field order of the row tuples returned by parse_exam_file, matching the exam table columns
+    PRELIM_FIELDS = ('course_code', 'exam_date', 'exam_locations')
+    FINAL_FIELDS = ('course_code', 'exam_date', 'exam_time', 'test_type', 'exam_locations')
+
     def __init__(self, semester: str, exam_type: str):
         """
         :param semester: Semester information (e.g., 'Fall 2024')
         :param exam_type: Type of exam (e.g., 'Prelim')
-        :param requester: Dependency injection for the HTTP requester (default: requests.get)
+        :param requester: Dependency injection for the HTTP requester (default: session.get)
         :param parser: Dependency injection for the HTML parser (default: BeautifulSoup)
         """
         self.base_url = "https://registrar.cornell.edu/exams/"
         self.semester = semester  
         self.exam_type = exam_type 
-        self.requester = requests.get
+        self.requester = session.get
+        self.timeout = (3, 10)  # (connect, read) seconds, so a hung registrar site can't stall a worker
         self.parser = BeautifulSoup
+        self.url = None
         self.file_name = None
+        self.save_to_file = False  # Debug hook: also write the scraped exam data to self.file_name
         self.exam_data_header = None
+        self.exam_data_text = None
         self.year = None
+        # Kept beside the app rather than in a shared /tmp, since cached rows are loaded straight into the DB
+        self.cache_dir = os.environ.get("SCRAPE_CACHE_DIR",
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".scrape-cache"))
+        self.cache_ttl = 24 * 60 * 60  # The registrar page only changes a few times a semester
 
     def scrape_course_info(self) -> Union[str, bool]:
         """
         Scrape course information from the website.
         :return: The raw exam data as a string.
         """
+        # Forget the last scrape so a failure here can't leave its data behind for process_exam_data
+        self.exam_data_text = None
+        self.year = None
+        from_cache = False
         try:
-            response = self.requester(self.generate_url())
-            response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
-            html_content = response.content
-            soup = self.parser(html_content, 'html.parser')
-            return self.parse_html(soup)
+            html_content = self.read_cache("html", binary=True)
+            from_cache = html_content is not None
+            if not from_cache:
+                response = self.requester(self.generate_url(), timeout=self.timeout)
+                response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
+                html_content = response.content  # Bytes, so BeautifulSoup detects the encoding from the page itself
+            soup = self.parser(html_content, 'lxml')
+            exam_data = self.parse_html(soup)
+            # Only cache pages that parsed, so an error or maintenance page is fetched again next time
+            if not from_cache:
+                self.write_cache("html", html_content)
+                self.clear_cache("rows.json")  # Parsed exams from the old page are stale now
+            return exam_data
         except Exception as e:
+            if from_cache:
+                self.clear_cache("html")
             return self.error_response(f"Error scraping course information: {e}")
 
     def parse_html(self, soup) -> str:
@@ -48,75 +86,68 @@ class WebScraper:
         strong_element.extract()
         exam_data = pre_element.get_text(strip=True)
         self.year = semester_info.split()[1]
+        self.exam_data_text = exam_data
 
         filename = lambda sem, year, exam: f"{sem.lower()}-{year}-{exam.lower()}-exams.txt"
         self.file_name = filename(self.semester, self.year, self.exam_type)
-        self.save_to_text_file(self.file_name, f"{semester_info}\n{exam_data}")
+        if self.save_to_file:
+            self.save_to_text_file(self.file_name, f"{semester_info}\n{exam_data}")
         return exam_data
 
-    def process_exam_data(self, filepath: str) -> Union[list[dict[str, str]], bool]:
+    def process_exam_data(self, filepath: str = None) -> Union[List[Tuple[str, ...]], bool]:
         """
-        Process the exam data from a file and return it in a structured format.
-        :param filepath: Path to the file containing exam data.
-        :return: Formatted exam data as a list of dictionaries.
+        Process the exam data and return it in a structured format.
+        :param filepath: Path to a file containing exam data (optional, default the last scraped data).
+        :return: Formatted exam data as a list of row tuples (see PRELIM_FIELDS and FINAL_FIELDS).
         """
-        assert filepath is not None
+        if filepath is None:
+            if self.exam_data_text is None:
+                return self.error_response("Error: No scraped exam data to process.")
+            cached_exams = self.read_cache("rows.json")
+            if cached_exams is not None:
+                return [tuple(row) for row in json.loads(cached_exams)]
+            exams = self.parse_exam_file(self.exam_data_text.splitlines())
+            self.write_cache("rows.json", json.dumps(exams))
+            return exams
         try:
             with open(filepath, 'r') as file:
                 return self.parse_exam_file(file)
         except FileNotFoundError:
             return self.error_response(f"Error: File '{filepath}' not found.")
 
-    def parse_exam_file(self, file) -> List[Dict[str, str]]:
+    def parse_exam_file(self, file) -> List[Tuple[str, ...]]:
         """
         Parse the exam file to extract structured exam data.
-        :param file: File object containing exam data.
-        :return: List of dictionaries with formatted exam data.
+        Rows are plain tuples rather than dicts to keep per-row memory low.
+        :param file: File object, or any iterable of lines, containing exam data.
+        :return: List of row tuples ordered as PRELIM_FIELDS or FINAL_FIELDS.
         """
         assert file is not None
+        exam_type = self.exam_type.lower()
+        if exam_type not in ("prelim", "final"):
+            raise ValueError("Unknown Exam Type")
+        is_final = exam_type == "final"
         formatted_data = []
         for line in file:
             line = line.strip()
             if line.startswith(self.semester) or line == "":
                 continue  # Skip header line or empty lines
             parts = line.split()
-            if self.exam_type.lower() == "prelim":
-                if len(parts[2]) == 3:  # If the course_code contains lec info
-                    course_code = f"{parts[0]} {parts[1]} {parts[2]}"
-                    exam_date = f"{parts[3]}"
-                    exam_locations = ' '.join(parts[4:])
-                else:  # It doesn't contain lec info, for now this check is reliable
-                    course_code = f"{parts[0]} {parts[1]}"
-                    exam_date = f"{parts[2]}"
-                    exam_locations = ' '.join(parts[3:])  # Join the rest as exam locations
-                formatted_exam = {
-                    'course_code': course_code.strip(),
-                    'exam_date': exam_date.strip(),
-                    'exam_locations': exam_locations.strip()
-                }
-            elif self.exam_type.lower() == "final":
-                if len(parts[2]) == 3:  # If the course_code contains lec info
-                    course_code = f"{parts[0]} {parts[1]} {parts[2]}"
-                    exam_date = f"{parts[3]}"
-                    exam_time = ' '.join(parts[4:6])
-                    test_type = ' '.join(parts[6:8])
-                    exam_locations = ' '.join(parts[8:])
-                else:  # It doesn't contain lec info, for now this check is reliable
-                    course_code = f"{parts[0]} {parts[1]}"
-                    exam_date = f"{parts[2]}"
-                    exam_time = ' '.join(parts[3:5])
-                    test_type = ' '.join(parts[5:7])
-                    exam_locations = ' '.join(parts[7:])
-
-                formatted_exam = {
-                    'course_code': course_code.strip(),
-                    'exam_date': exam_date.strip(),
-                    'exam_time': exam_time.strip(),
-                    'test_type': test_type.strip(),
-                    'exam_locations': exam_locations.strip(),
-                }
+            n = 3 if len(parts[2]) == 3 else 2  # A 3 character third token is lec info, for now this check is reliable
+            if is_final:
+                formatted_exam = (
+                    ' '.join(parts[:n]),  # course_code
+                    parts[n],  # exam_date
+                    ' '.join(parts[n + 1:n + 3]),  # exam_time
+                    ' '.join(parts[n + 3:n + 5]),  # test_type
+                    ' '.join(parts[n + 5:]),  # exam_locations
+                )
             else:
-                raise ValueError("Unknown Exam Type")
+                formatted_exam = (
+                    ' '.join(parts[:n]),  # course_code
+                    parts[n],  # exam_date
+                    ' '.join(parts[n + 1:]),  # exam_locations
+                )
             formatted_data.append(formatted_exam)
         return formatted_data
 
@@ -125,9 +156,92 @@ class WebScraper:
         Generate the URL for scraping exam data.
         :return: The generated URL as a string.
         """
-        semester_param = self.semester.lower().replace(" ", "-")
-        exam_type_param = self.exam_type.lower().replace(" ", "-")
-        return f"{self.base_url}{semester_param}-{exam_type_param}-exam-schedule"
+        if self.url is None:
+            semester_param = self.semester.lower().replace(" ", "-")
+            exam_type_param = self.exam_type.lower().replace(" ", "-")
+            self.url = f"{self.base_url}{semester_param}-{exam_type_param}-exam-schedule"
+        return self.url
+
+    def cache_path(self, suffix: str) -> str:
+        """
+        Generate the path of a cache entry for this semester and exam type.
+        :param suffix: Kind of entry (e.g., 'html' for the page, 'rows.json' for parsed exams).
+        :return: The cache file path as a string.
+        """
+        key = f"{self.semester}-{self.exam_type}".lower().replace(" ", "-")
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def ensure_cache_dir(self) -> bool:
+        """
+        Create the cache directory (mode 0700) if needed and check that it is safe to use:
+        a real directory owned by this user that nobody else can write to.
+        :return: True if the cache directory can be used, False otherwise.
+        """
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            info = os.lstat(self.cache_dir)
+        except OSError as e:
+            return self.error_response(f"Error creating cache directory {self.cache_dir}: {e}")
+        owned = not hasattr(os, "getuid") or info.st_uid == os.getuid()
+        if not stat.S_ISDIR(info.st_mode) or not owned or info.st_mode & 0o022:
+            return self.error_response(f"Not using cache directory {self.cache_dir}: "
+                                       f"it must be a directory owned by this user and not writable by others")
+        return True
+
+    def read_cache(self, suffix: str, binary: bool = False) -> Union[str, bytes, None]:
+        """
+        Read a cache entry if it exists and is younger than the cache TTL.
+        :param suffix: Kind of entry (e.g., 'html' for the page, 'rows.json' for parsed exams).
+        :param binary: Return the entry as bytes rather than text (optional, default False).
+        :return: The cached data, or None on a miss.
+        """
+        if not self.ensure_cache_dir():
+            return None
+        path = self.cache_path(suffix)
+        try:
+            if time.time() - os.path.getmtime(path) < self.cache_ttl:
+                if binary:
+                    with open(path, 'rb') as f:
+                        return f.read()
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+        except OSError:
+            pass
+        return None
+
+    def write_cache(self, suffix: str, data: Union[str, bytes]) -> bool:
+        """
+        Write a cache entry, replacing the old one atomically.
+        :param suffix: Kind of entry (e.g., 'html' for the page, 'rows.json' for parsed exams).
+        :param data: Data to be cached, as text or bytes.
+        :return: True if successful, False otherwise.
+        """
+        assert data is not None
+        if not self.ensure_cache_dir():
+            return False
+        path = self.cache_path(suffix)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            if isinstance(data, bytes):
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+            else:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            return self.error_response(f"Error writing cache file {path}: {e}")
+
+    def clear_cache(self, suffix: str) -> None:
+        """
+        Remove a cache entry if it exists.
+        :param suffix: Kind of entry (e.g., 'html' for the page, 'rows.json' for parsed exams).
+        """
+        try:
+            os.remove(self.cache_path(suffix))
+        except OSError:
+            pass
 
     def save_to_text_file(self, file_name: str, data: str) -> bool:
         """